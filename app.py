@@ -1,18 +1,20 @@
 from __future__ import annotations
 
+import functools
+import math
+import string
 import time
 import sqlite3
 import calendar
 from datetime import datetime, timedelta, time as dtime
 from typing import Optional
 
+import numpy as np
 import pandas as pd
-import plotly.express as px
 import streamlit as st
 
-from google import genai
-from google.genai import types
-
+# plotly / google-genai는 각각 리포트 탭·AI 리포트에서만 쓰므로
+# 모듈 임포트 비용(수백 ms)을 해당 경로 안으로 지연시킨다
 from pathlib import Path
 
 
@@ -33,20 +35,20 @@ SEAT_BASE_MIN = 180   # 기본 3시간
 SEAT_ALERT_WINDOW_SEC = 59 * 60  # 59분 이하부터 알림
 
 
-def _dt_at(dt: datetime, hh: int, mm: int = 0, ss: int = 0) -> datetime:
-    return dt.replace(hour=hh, minute=mm, second=ss, microsecond=0)
+def is_seat_reset_window(now: datetime) -> bool:
+    # 경계가 정시(23:00/06:00)라 시(hour) 정수 비교면 충분 — 틱마다 time 객체를 만들지 않는다
+    return now.hour >= SEAT_CLOSE_HOUR or now.hour < SEAT_OPEN_HOUR
 
 
-def is_seat_reset_window(now: datetime) -> bool:
-    t = now.time()
-    return (t >= dtime(SEAT_CLOSE_HOUR, 0)) or (t < dtime(SEAT_OPEN_HOUR, 0))
+@functools.lru_cache(maxsize=64)
+def _seat_open_dt(day, before_open: bool) -> datetime:
+    open_dt = datetime.combine(day, dtime(SEAT_OPEN_HOUR, 0))
+    return open_dt if before_open else open_dt + timedelta(days=1)
 
 
 def next_seat_open_dt(now: datetime) -> datetime:
-    today_open = _dt_at(now, SEAT_OPEN_HOUR, 0, 0)
-    if now.time() < dtime(SEAT_OPEN_HOUR, 0):
-        return today_open
-    return today_open + timedelta(days=1)
+    # 결과는 (날짜, 06시 이전 여부)에만 의존 — 1초 틱 60회가 캐시 히트 1건으로 줄어든다
+    return _seat_open_dt(now.date(), now.hour < SEAT_OPEN_HOUR)
 
 
 def seat_close_dt_for(start_dt: datetime) -> datetime:
@@ -59,6 +61,21 @@ def get_seat_expiry_dt(seat_start_dt: datetime, extension_min: int) -> datetime:
     return min(base_expiry, close_dt)
 
 
+def get_seat_expiry_epoch(start_epoch: float, close_epoch: float, extension_min: int) -> float:
+    return min(start_epoch + (SEAT_BASE_MIN + int(extension_min)) * 60, close_epoch)
+
+
+def compute_seat_left_seconds_epoch(
+    now_epoch: float, start_epoch: Optional[float], close_epoch: Optional[float], extension_min: int
+) -> Optional[float]:
+    """1초 틱용 순수 정수/실수 연산 버전 — datetime/timedelta 객체를 만들지 않는다."""
+    if start_epoch is None or close_epoch is None:
+        return None
+    if now_epoch < start_epoch:
+        return None
+    return get_seat_expiry_epoch(start_epoch, close_epoch, extension_min) - now_epoch
+
+
 def compute_seat_left_seconds(
     now: datetime, seat_start_dt: Optional[datetime], extension_min: int
 ) -> Optional[float]:
@@ -66,20 +83,42 @@ def compute_seat_left_seconds(
         return None
     if is_seat_reset_window(now):
         return None
-    if now < seat_start_dt:
-        return None
-    expiry = get_seat_expiry_dt(seat_start_dt, extension_min)
-    return (expiry - now).total_seconds()
+    return compute_seat_left_seconds_epoch(
+        now.timestamp(),
+        seat_start_dt.timestamp(),
+        seat_close_dt_for(seat_start_dt).timestamp(),
+        extension_min,
+    )
+
+
+def set_seat_start_dt(settings: dict, seat_start_dt: datetime) -> None:
+    """좌석 시작 시각과 함께, 틱 경로에서 쓰는 epoch 파생값을 같이 저장한다."""
+    settings["seat_start_dt"] = seat_start_dt
+    settings["seat_start_epoch"] = seat_start_dt.timestamp()
+    settings["seat_close_epoch"] = seat_close_dt_for(seat_start_dt).timestamp()
 
 
-def format_hms(sec: float) -> str:
-    s = int(max(0, sec))
+@functools.lru_cache(maxsize=90000)
+def format_hms(sec: int) -> str:
+    # 호출부가 정수 초로 양자화해서 넘긴다 — 같은 초는 캐시 히트
+    s = max(0, sec)
     h = s // 3600
     m = (s % 3600) // 60
     ss = s % 60
     return f"{h}:{m:02d}:{ss:02d}"
 
 
+# 좌석 박스 HTML — 매 틱 f-string 전체를 다시 조립하지 않도록 가변 필드만 % 치환
+_SEAT_RESET_TMPL = (
+    "<div class='seat-box' style='margin-top:0;'><div class='seat-ok'>"
+    "<b>🪑 23:00~06:00 (예약 불필요) · 다음 운영 %s</b></div></div>"
+)
+_SEAT_UNSET_HTML = "<div class='seat-box' style='margin-top:0;'><div class='seat-exp'>🪑 좌석 시간 미설정</div></div>"
+_SEAT_PRE_TMPL = "<div class='seat-box' style='margin-top:0;'><div class='seat-ok'>🪑 예약 전 · 시작 %s</div></div>"
+_SEAT_OK_TMPL = "<div class='seat-box' style='margin-top:0;'><div class='seat-ok'>🪑 만료까지 <b>%s</b> · (%s)</div></div>"
+_SEAT_EXP_HTML = "<div class='seat-box' style='margin-top:0;'><div class='seat-exp'>🪑 좌석 만료</div></div>"
+
+
 # ==========================================
 # 1. DB 유틸
 # ==========================================
@@ -93,14 +132,19 @@ DB_PATH = str(DATA_DIR / "study_manager.db")
 def get_conn() -> sqlite3.Connection:
     conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # Streamlit rerun 중 쓰기-읽기 경합을 줄이기 위한 WAL + 튜닝 pragma
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=134217728")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA foreign_keys=ON")
     return conn
 
 
 def init_db(conn: sqlite3.Connection) -> None:
-    c = conn.cursor()
-
     # interruptions: phase 컬럼 포함
-    c.execute(
+    conn.execute(
         """
         CREATE TABLE IF NOT EXISTS interruptions (
             id INTEGER PRIMARY KEY,
@@ -111,23 +155,19 @@ def init_db(conn: sqlite3.Connection) -> None:
         )
         """
     )
-    # 기존 DB에서 phase 컬럼이 없던 경우를 위한 마이그레이션
-    try:
-        c.execute("SELECT phase FROM interruptions LIMIT 1")
-    except sqlite3.OperationalError:
-        c.execute("ALTER TABLE interruptions ADD COLUMN phase TEXT DEFAULT 'UNKNOWN'")
-
-    c.execute(
+    conn.execute(
         """
         CREATE TABLE IF NOT EXISTS study_sessions (
             id INTEGER PRIMARY KEY,
             start_time TEXT,
             end_time TEXT,
-            focus_minutes INTEGER
+            focus_minutes INTEGER,
+            start_epoch INTEGER,
+            end_epoch INTEGER
         )
         """
     )
-    c.execute(
+    conn.execute(
         """
         CREATE TABLE IF NOT EXISTS todos (
             id INTEGER PRIMARY KEY,
@@ -139,37 +179,226 @@ def init_db(conn: sqlite3.Connection) -> None:
         )
         """
     )
-    try:
-        c.execute("SELECT task_order FROM todos LIMIT 1")
-    except sqlite3.OperationalError:
-        c.execute("ALTER TABLE todos ADD COLUMN task_order INTEGER DEFAULT 999")
-
-    c.execute("UPDATE interruptions SET phase='UNKNOWN' WHERE phase IS NULL")
+    # 구버전 DB 마이그레이션은 user_version으로 게이트 — 이후 rerun은 pragma 읽기 한 번으로 끝
+    schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if schema_version < 1:
+        try:
+            conn.execute("SELECT phase FROM interruptions LIMIT 1")
+        except sqlite3.OperationalError:
+            conn.execute("ALTER TABLE interruptions ADD COLUMN phase TEXT DEFAULT 'UNKNOWN'")
+        try:
+            conn.execute("SELECT task_order FROM todos LIMIT 1")
+        except sqlite3.OperationalError:
+            conn.execute("ALTER TABLE todos ADD COLUMN task_order INTEGER DEFAULT 999")
+        conn.execute("UPDATE interruptions SET phase='UNKNOWN' WHERE phase IS NULL")
+        conn.execute("PRAGMA user_version = 1")
+
+    if schema_version < 2:
+        # 세션 타임스탬프를 epoch 정수로 전환 — 기존 문자열 행은 한 번만 백필
+        for col in ("start_epoch", "end_epoch"):
+            try:
+                conn.execute(f"SELECT {col} FROM study_sessions LIMIT 1")
+            except sqlite3.OperationalError:
+                conn.execute(f"ALTER TABLE study_sessions ADD COLUMN {col} INTEGER")
+        conn.execute(
+            "UPDATE study_sessions SET "
+            "start_epoch = CAST(strftime('%s', start_time) AS INT), "
+            "end_epoch = CAST(strftime('%s', end_time) AS INT) "
+            "WHERE start_epoch IS NULL AND start_time IS NOT NULL"
+        )
+        conn.execute("DROP INDEX IF EXISTS idx_sessions_start")
+        conn.execute("PRAGMA user_version = 2")
+
+    # 리포트/투두 조회가 풀스캔 대신 인덱스 탐색을 타도록
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_start_epoch ON study_sessions(start_epoch)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_interrupt_ts ON interruptions(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_interrupt_phase_ts ON interruptions(phase, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_todos_date ON todos(date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_todos_status_order ON todos(status, task_order)")
     conn.commit()
 
 
-def reset_db() -> None:
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DROP TABLE IF EXISTS interruptions")
-    c.execute("DROP TABLE IF EXISTS study_sessions")
-    c.execute("DROP TABLE IF EXISTS todos")
+def reset_db(conn: sqlite3.Connection) -> None:
+    # 캐시된 커넥션을 그대로 재사용 (재연결/캐시 초기화 불필요)
+    conn.execute("DROP TABLE IF EXISTS interruptions")
+    conn.execute("DROP TABLE IF EXISTS study_sessions")
+    conn.execute("DROP TABLE IF EXISTS todos")
     conn.commit()
-    conn.close()
-    st.cache_resource.clear()
+    init_db(conn)
+
+# 매 rerun(특히 1초 타이머 틱)마다 같은 SELECT + DataFrame 생성을 반복하지 않도록
+# 버전 카운터를 캐시 키로 쓴다 — 쓰기 경로가 _bump_version으로만 무효화한다
+@st.cache_data(show_spinner=False)
+def load_todos(version: int) -> pd.DataFrame:
+    # data_editor 한 개가 전체 목록을 그리므로 에디터 스키마(id/task/done)로 돌려준다
+    df = pd.read_sql(
+        "SELECT id, task, status FROM todos WHERE status != 'deleted' ORDER BY task_order ASC", get_conn()
+    )
+    df["done"] = df["status"] == "done"
+    return df[["id", "task", "done"]]
+
+
+@st.cache_data(show_spinner=False)
+def load_sessions(version: int) -> pd.DataFrame:
+    return pd.read_sql("SELECT * FROM study_sessions", get_conn())
+
+
+@st.cache_data(show_spinner=False)
+def load_interruptions(version: int) -> pd.DataFrame:
+    return pd.read_sql("SELECT * FROM interruptions", get_conn())
+
+
+@st.cache_data(show_spinner=False)
+def prep_sessions(version: int) -> pd.DataFrame:
+    """세션 테이블에 datetime/파생 컬럼까지 붙여 캐시한다 — rerun마다 O(N) 파싱 금지."""
+    df = load_sessions(version)
+    if df.empty:
+        return df
+    start_time = pd.to_datetime(df["start_epoch"], unit="s", errors="coerce")
+    # copy() 후 컬럼별 대입 대신 assign 한 번으로 새 프레임을 만든다
+    return df.assign(
+        start_time=start_time,
+        focus_minutes=pd.to_numeric(df["focus_minutes"], errors="coerce").fillna(0),
+        weekday_idx=start_time.dt.weekday,  # 월=0 — calendar.day_name 순서와 일치
+        hour=start_time.dt.hour,
+    )
+
+
+@st.cache_data(show_spinner=False)
+def daily_focus(version: int, days: int) -> pd.DataFrame:
+    df = prep_sessions(version)
+    if df.empty:
+        return pd.DataFrame(columns=["날짜", "집중시간(분)"])
+    cutoff = datetime.now() - timedelta(days=days)
+    # ndarray 비교로 마스크를 만들고 뷰로만 읽는다 — 복사본 불필요
+    dff = df.loc[df["start_time"].to_numpy() >= np.datetime64(cutoff)]
+    # normalize()로 datetime64 키를 그대로 쓰면 date 객체 → 재파싱 왕복이 없다
+    out = dff.groupby(dff["start_time"].dt.normalize())["focus_minutes"].sum().reset_index()
+    out.columns = ["날짜", "집중시간(분)"]
+    return out.sort_values("날짜")
+
+
+# 차트는 직렬화된 dict로 캐시한다 — 같은 (버전, 기간)이면 px의
+# figure 생성/검증 파이프라인을 건너뛰고 go.Figure(dict) 재생만 한다
+@st.cache_data(show_spinner=False)
+def build_daily_fig(version: int, days: int) -> dict | None:
+    import plotly.express as px
+
+    df_daily = daily_focus(version, days)
+    if df_daily.empty:
+        return None
+    fig = px.line(df_daily, x="날짜", y="집중시간(분)", markers=True, text="집중시간(분)")
+    fig.update_layout(hovermode="x unified", xaxis_title=None)
+    fig.update_traces(line_width=3, marker_size=10, textposition="top center")
+    return fig.to_dict()
+
+
+@st.cache_data(show_spinner=False)
+def build_heatmap_fig(version: int, days: int) -> dict | None:
+    import plotly.express as px
+
+    df = prep_sessions(version)
+    if df.empty:
+        return None
+    cutoff = datetime.now() - timedelta(days=days)
+    dff = df.loc[df["start_time"].to_numpy() >= np.datetime64(cutoff)]
+    if dff.empty:
+        return None
+
+    # weekday_idx/hour는 prep_sessions에서 이미 붙어 있다 —
+    # groupby→pivot→reindex 체인 대신 (24,7) 행렬에 한 번에 누적
+    days_order = list(calendar.day_name)
+    all_hours = list(range(24))
+    mat = np.zeros((24, 7))
+    np.add.at(
+        mat,
+        (dff["hour"].to_numpy(), dff["weekday_idx"].to_numpy()),
+        dff["focus_minutes"].to_numpy(),
+    )
+
+    fig_hm = px.imshow(
+        mat,
+        labels=dict(x="요일", y="시간", color="분"),
+        x=days_order,
+        y=all_hours,
+        color_continuous_scale="Reds",
+        aspect="auto",
+    )
+    fig_hm.update_yaxes(
+        tickmode="array",
+        tickvals=[0, 6, 12, 18, 23],
+        ticktext=["00:00", "06:00", "12:00", "18:00", "24:00"],
+        autorange="reversed",
+    )
+    fig_hm.update_layout(margin=dict(l=0, r=0, t=0, b=0), height=300)
+    return fig_hm.to_dict()
+
+
+@st.cache_data(show_spinner=False)
+def build_reason_pie_fig(version: int) -> dict | None:
+    import plotly.express as px
+
+    df_i = load_interruptions(version)
+    if df_i.empty or "phase" not in df_i.columns:
+        return None
+    df_i_focus = df_i.loc[df_i["phase"].to_numpy() == "FOCUS"]
+    if df_i_focus.empty:
+        return None
+
+    reason_counts = df_i_focus["reason"].value_counts().reset_index()
+    reason_counts.columns = ["reason", "count"]
+    fig_pie = px.pie(reason_counts, values="count", names="reason", hole=0.4)
+    fig_pie.update_layout(margin=dict(l=0, r=0, t=0, b=0), height=300, showlegend=False)
+    fig_pie.update_traces(textposition="inside", textinfo="percent+label")
+    return fig_pie.to_dict()
+
+
+def _bump_version(key: str) -> None:
+    st.session_state[key] = st.session_state.get(key, 0) + 1
+
+
+def _flush_todos(editor_key: str) -> None:
+    # data_editor가 넘겨주는 행 diff만 보고 버킷별 executemany 한 번씩으로 반영
+    state = st.session_state[editor_key]
+    df = load_todos(st.session_state["todos_version"])
+    conn = get_conn()
+
+    updates = []
+    for idx, delta in state["edited_rows"].items():
+        row = df.iloc[int(idx)]
+        task = delta.get("task", row["task"])
+        done = delta.get("done", bool(row["done"]))
+        updates.append((task, "done" if done else "pending", int(row["id"])))
 
-def delete_records(table_name: str, id_list: list[int]) -> None:
+    deletions = [(int(df.iloc[int(idx)]["id"]),) for idx in state["deleted_rows"]]
+    added = [r.get("task") for r in state["added_rows"] if r.get("task")]
+
+    if not (updates or deletions or added):
+        return
+    today = datetime.now().strftime("%Y-%m-%d")
+    with conn:
+        if updates:
+            conn.executemany("UPDATE todos SET task=?, status=? WHERE id=?", updates)
+        if deletions:
+            conn.executemany("UPDATE todos SET status='deleted' WHERE id=?", deletions)
+        for task in added:
+            conn.execute(
+                """
+                INSERT INTO todos (task, status, date, is_subtask, task_order)
+                SELECT ?, ?, ?, ?, COALESCE(MAX(task_order), 0) + 1
+                FROM todos WHERE status != 'deleted'
+                """,
+                (task, "pending", today, 0),
+            )
+    _bump_version("todos_version")
+
+
+def delete_records(conn: sqlite3.Connection, table_name: str, id_list: list[int]) -> None:
     if not id_list:
         return
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    # 안전한 쿼리 생성을 위해 placeholder 사용
-    placeholders = ', '.join('?' for _ in id_list)
-    query = f"DELETE FROM {table_name} WHERE id IN ({placeholders})"
-    c.execute(query, id_list)
-    conn.commit()
-    conn.close()
-    st.cache_resource.clear() # 캐시 초기화
+    # executemany면 IN 절의 999개 파라미터 제한과 무관하게 트랜잭션 하나로 처리된다
+    with conn:
+        conn.executemany(f"DELETE FROM {table_name} WHERE id=?", [(int(i),) for i in id_list])
 
 
 # ==========================================
@@ -180,62 +409,111 @@ def _minutes_between(t0: datetime, t1: datetime) -> int:
     return sec // 60
 
 
+def _wall_epoch(dt: datetime) -> int:
+    """벽시계 시각을 UTC로 간주한 epoch 초.
+
+    기존 문자열 행을 strftime('%s')로 백필한 값과 해석이 일치하므로
+    저장/집계/표시가 전부 같은 축 위에서 움직인다.
+    """
+    return calendar.timegm(dt.timetuple())
+
+
 def log_focus_segment_if_any(conn: sqlite3.Connection, seg_start: Optional[datetime], seg_end: datetime) -> int:
+    """커밋하지 않는다 — 호출부가 `with conn:` 트랜잭션으로 묶는다."""
     if not seg_start:
         return 0
     mins = _minutes_between(seg_start, seg_end)
     if mins <= 0:
         return 0
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO study_sessions (start_time, end_time, focus_minutes) VALUES (?, ?, ?)",
-        (seg_start.strftime("%Y-%m-%d %H:%M:%S"), seg_end.strftime("%Y-%m-%d %H:%M:%S"), mins),
+    conn.execute(
+        "INSERT INTO study_sessions (start_epoch, end_epoch, focus_minutes) VALUES (?, ?, ?)",
+        (_wall_epoch(seg_start), _wall_epoch(seg_end), mins),
     )
-    conn.commit()
     return mins
 
 
 # ==========================================
 # 3. Gemini 리포트
 # ==========================================
-def _time_band(h: int) -> str:
-    if h < 6:
-        return "새벽(00-06)"
-    if h < 12:
-        return "오전(06-12)"
-    if h < 18:
-        return "오후(12-18)"
-    return "저녁(18-24)"
+@st.cache_resource
+def _get_genai_client(api_key: str):
+    from google import genai
 
+    # TLS/인증 설정 비용이 있으므로 키별로 한 번만 생성
+    return genai.Client(api_key=api_key)
 
-def ai_generate_report(api_key: str, df_focus: pd.DataFrame, df_interrupt: pd.DataFrame, period_label: str, days: int) -> str:
-    if not api_key:
-        return "API 키가 입력되지 않았습니다."
 
-    cutoff = datetime.now() - timedelta(days=days)
+TIME_BAND_LABELS = np.array(["새벽(00-06)", "오전(06-12)", "오후(12-18)", "저녁(18-24)"])
 
-    # Focus summary
-    f = df_focus.copy()
-    if "start_time" not in f.columns:
-        return "학습 데이터 형식이 올바르지 않습니다."
-    f["start_time"] = pd.to_datetime(f["start_time"], errors="coerce")
-    f["focus_minutes"] = pd.to_numeric(f.get("focus_minutes"), errors="coerce").fillna(0)
-    f = f.dropna(subset=["start_time"])
-    f = f[f["start_time"] >= cutoff].copy()
+# SQLite strftime('%w')는 0=일요일
+SQLITE_WEEKDAY_NAMES = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
 
-    total_min = int(f["focus_minutes"].sum())
-    total_hr = round(total_min / 60.0, 1)
 
-    f["date"] = f["start_time"].dt.date
-    daily = f.groupby("date", as_index=False)["focus_minutes"].sum().sort_values("date")
-    active_days = int((daily["focus_minutes"] > 0).sum()) if not daily.empty else 0
+def get_focus_summary(conn: sqlite3.Connection, cutoff_epoch: int) -> list[sqlite3.Row]:
+    """일/요일/시간대별 집중 합계를 SQLite 한 번의 패스로 집계한다."""
+    return conn.execute(
+        """
+        SELECT strftime('%Y-%m-%d', start_epoch, 'unixepoch') AS d,
+               CAST(strftime('%w', start_epoch, 'unixepoch') AS INT) AS wd,
+               CAST(strftime('%H', start_epoch, 'unixepoch') AS INT) / 6 AS band,
+               SUM(focus_minutes) AS m
+        FROM study_sessions
+        WHERE start_epoch >= ?
+        GROUP BY d, wd, band
+        """,
+        (cutoff_epoch,),
+    ).fetchall()
+
+
+def get_top_interrupt_reasons(conn: sqlite3.Connection, cutoff_iso: str, k: int = 3) -> list[sqlite3.Row]:
+    """(phase, timestamp) 인덱스 범위 스캔 한 번으로 FOCUS 중 상위 방해 사유를 뽑는다."""
+    return conn.execute(
+        """
+        SELECT reason, COUNT(*) AS c
+        FROM interruptions
+        WHERE phase='FOCUS' AND timestamp >= ?
+        GROUP BY reason ORDER BY c DESC LIMIT ?
+        """,
+        (cutoff_iso, k),
+    ).fetchall()
+
+
+@st.cache_data(ttl=60)
+def _summarize(days: int) -> dict:
+    """리포트용 집계 dict를 만든다. 집계는 SQL로 줄여 받고, 작은 결과만 파이썬에서 마무리한다."""
+    conn = get_conn()
+    cutoff = datetime.now() - timedelta(days=days)
+    cutoff_iso = cutoff.strftime("%Y-%m-%d %H:%M:%S")
+
+    # Focus summary: GROUP BY 결과는 한 달 기준 수십 행 수준
+    rows = get_focus_summary(conn, _wall_epoch(cutoff))
+
+    daily: dict[str, int] = {}
+    wk_tot = np.zeros(7)
+    bd_tot = np.zeros(4)
+    if rows:
+        n = len(rows)
+        wd = np.fromiter((int(r["wd"]) for r in rows), dtype=np.int64, count=n)
+        band = np.minimum(np.fromiter((int(r["band"]) for r in rows), dtype=np.int64, count=n), 3)
+        m = np.fromiter((int(r["m"] or 0) for r in rows), dtype=np.float64, count=n)
+        # 키 공간이 작고 고정(요일 7, 시간대 4)이라 bincount 한 번이면 끝
+        wk_tot = np.bincount(wd, weights=m, minlength=7)
+        bd_tot = np.bincount(band, weights=m, minlength=4)
+        for r, mv in zip(rows, m):
+            daily[r["d"]] = daily.get(r["d"], 0) + int(mv)
+
+    total_min = sum(daily.values())
+    total_hr = round(total_min / 60.0, 1)
+    active_days = sum(1 for v in daily.values() if v > 0)
     avg_daily = int(total_min / max(1, active_days))
 
+    days_sorted = sorted(daily.items())
     trend_text = "데이터가 아직 부족합니다."
-    if len(daily) >= 4:
-        last3 = int(daily.tail(3)["focus_minutes"].sum())
-        prev = int(daily.iloc[:-3]["focus_minutes"].sum())
-        prev_days = max(1, len(daily) - 3)
+    if len(days_sorted) >= 4:
+        vals = [v for _, v in days_sorted]
+        last3 = sum(vals[-3:])
+        prev = sum(vals[:-3])
+        prev_days = max(1, len(vals) - 3)
         prev3_scaled = int(prev / prev_days * 3)
         delta = last3 - prev3_scaled
         if delta >= 30:
@@ -247,48 +525,52 @@ def ai_generate_report(api_key: str, df_focus: pd.DataFrame, df_interrupt: pd.Da
 
     best_day = "없음"
     worst_day = "없음"
-    if not daily.empty:
-        best = daily.loc[daily["focus_minutes"].idxmax()]
-        worst = daily.loc[daily["focus_minutes"].idxmin()]
-        best_day = f"{best['date']}에 {int(best['focus_minutes'])}분"
-        worst_day = f"{worst['date']}에 {int(worst['focus_minutes'])}분"
+    if days_sorted:
+        best_d, best_m = max(days_sorted, key=lambda kv: kv[1])
+        worst_d, worst_m = min(days_sorted, key=lambda kv: kv[1])
+        best_day = f"{best_d}에 {best_m}분"
+        worst_day = f"{worst_d}에 {worst_m}분"
 
     rhythm_weekday = "데이터 부족"
     rhythm_band = "데이터 부족"
-    if not f.empty:
-        f["weekday"] = f["start_time"].dt.day_name()
-        f["hour"] = f["start_time"].dt.hour
-        f["time_band"] = f["hour"].apply(lambda x: _time_band(int(x)))
-
-        wk = f.groupby("weekday")["focus_minutes"].sum().sort_values(ascending=False)
-        bd = f.groupby("time_band")["focus_minutes"].sum().sort_values(ascending=False)
-
-        if not wk.empty:
-            rhythm_weekday = f"{wk.index[0]} ({int(wk.iloc[0])}분)"
-        if not bd.empty:
-            rhythm_band = f"{bd.index[0]} ({int(bd.iloc[0])}분)"
-
-    it = df_interrupt.copy()
-    if "timestamp" in it.columns:
-        it["timestamp"] = pd.to_datetime(it["timestamp"], errors="coerce")
-        it = it.dropna(subset=["timestamp"])
-        it = it[it["timestamp"] >= cutoff].copy()
-    else:
-        it = it.iloc[0:0]
-
-    # AI 리포트에서도 FOCUS 중 기록만 집계
-    it_focus = it[it.get("phase", "UNKNOWN") == "FOCUS"] if not it.empty else it
+    if rows:
+        wi = int(wk_tot.argmax())
+        bi = int(bd_tot.argmax())
+        rhythm_weekday = f"{SQLITE_WEEKDAY_NAMES[wi]} ({int(wk_tot[wi])}분)"
+        rhythm_band = f"{TIME_BAND_LABELS[bi]} ({int(bd_tot[bi])}분)"
+
+    # AI 리포트에서도 FOCUS 중 기록만 집계 (상위 사유는 SQL에서 바로 top-k)
+    top3 = get_top_interrupt_reasons(conn, cutoff_iso)
+    interrupt_cnt = int(
+        conn.execute(
+            "SELECT COUNT(*) FROM interruptions WHERE phase='FOCUS' AND timestamp >= ?",
+            (cutoff_iso,),
+        ).fetchone()[0]
+    )
 
-    interrupt_cnt = int(len(it_focus))
     top_interrupt = "중단 기록이 없습니다."
     biggest_one = "없음"
-    if not it_focus.empty and "reason" in it_focus.columns:
-        vc = it_focus["reason"].value_counts()
-        top3 = vc.head(3)
-        top_interrupt = "\n".join([f"- {k}: {int(v)}회" for k, v in top3.items()])
-        biggest_one = str(top3.index[0])
+    if top3:
+        top_interrupt = "\n".join([f"- {r['reason']}: {int(r['c'])}회" for r in top3])
+        biggest_one = str(top3[0]["reason"])
+
+    return {
+        "total_min": total_min,
+        "total_hr": total_hr,
+        "active_days": active_days,
+        "avg_daily": avg_daily,
+        "trend_text": trend_text,
+        "best_day": best_day,
+        "worst_day": worst_day,
+        "rhythm_weekday": rhythm_weekday,
+        "rhythm_band": rhythm_band,
+        "interrupt_cnt": interrupt_cnt,
+        "top_interrupt": top_interrupt,
+        "biggest_one": biggest_one,
+    }
 
-    prompt = f"""
+
+PROMPT_TEMPLATE = """
 너는 따뜻하지만 날카로운 '학습 코치'다.
 아래 데이터를 바탕으로 사용자가 “읽고 바로 행동할 수 있는” 상세 리포트를 한국어로 작성해라.
 
@@ -326,8 +608,20 @@ def ai_generate_report(api_key: str, df_focus: pd.DataFrame, df_interrupt: pd.Da
 - 전체 길이 900자 이내.
 """.strip()
 
+
+def ai_generate_report(api_key: str, period_label: str, days: int) -> str:
+    if not api_key:
+        return "API 키가 입력되지 않았습니다."
+
+    # 템플릿은 모듈 상수 — 호출마다 채우는 건 요약 dict뿐
+    prompt = PROMPT_TEMPLATE.format_map(
+        {**_summarize(days), "period_label": period_label, "days": days}
+    )
+
     try:
-        client = genai.Client(api_key=api_key)
+        from google.genai import types
+
+        client = _get_genai_client(api_key)
         model_id = "gemini-2.5-flash"
         resp = client.models.generate_content(
             model=model_id,
@@ -343,37 +637,47 @@ def ai_generate_report(api_key: str, df_focus: pd.DataFrame, df_interrupt: pd.Da
 # ==========================================
 # 4. 타이머 원형 HTML
 # ==========================================
-def get_filled_pie_html(percentage: float, color: str, time_text: str, status_text: str) -> str:
-    radius = 25
-    circumference = 2 * 3.14159 * radius
-    pct = max(0.0, min(100.0, float(percentage)))
-    stroke_dasharray = f"{circumference * pct / 100.0} {circumference}"
+_PIE_RADIUS = 25
+_CIRC = 2 * math.pi * _PIE_RADIUS
 
-    svg_html = f"""
+# 1초마다 호출되는 경로라 상수 부분은 모듈 로드 시 한 번만 조립한다
+_PIE_TEMPLATE = string.Template(
+    f"""
+    <div style="display: flex; justify-content: center; align-items: center; flex-direction: column;">
     <div style="position: relative; width: 300px; height: 300px; margin-bottom: 10px;">
         <svg width="300" height="300" viewBox="0 0 100 100">
-            <circle cx="50" cy="50" r="{radius}" fill="none" stroke="#eee" stroke-width="50" />
-            <circle cx="50" cy="50" r="{radius}" fill="none" stroke="{color}" stroke-width="50"
-                stroke-dasharray="{stroke_dasharray}"
+            <circle cx="50" cy="50" r="{_PIE_RADIUS}" fill="none" stroke="#eee" stroke-width="50" />
+            <circle cx="50" cy="50" r="{_PIE_RADIUS}" fill="none" stroke="$COLOR" stroke-width="50"
+                stroke-dasharray="$DASH"
                 stroke-linecap="butt"
                 transform="rotate(-90 50 50)"
                 style="transition: stroke-dasharray 1s linear;"
             />
         </svg>
     </div>
-    """
-    text_html = f"""
     <div style="text-align: center;">
-        <div style="font-size: 3.5rem; font-weight: bold; color: #333; line-height: 1.0;">{time_text}</div>
-        <div style="font-size: 1.5rem; font-weight: bold; color: {color}; margin-top: 5px;">{status_text}</div>
+        <div style="font-size: 3.5rem; font-weight: bold; color: #333; line-height: 1.0;">$TIME</div>
+        <div style="font-size: 1.5rem; font-weight: bold; color: $COLOR; margin-top: 5px;">$STATUS</div>
     </div>
-    """
-    return f"""
-    <div style="display: flex; justify-content: center; align-items: center; flex-direction: column;">
-        {svg_html}
-        {text_html}
     </div>
     """
+)
+
+
+def get_filled_pie_html(percentage: float, color: str, time_text: str, status_text: str) -> str:
+    pct = max(0.0, min(100.0, float(percentage)))
+    return _PIE_TEMPLATE.substitute(
+        DASH=f"{_CIRC * pct / 100.0:.2f} {_CIRC:.2f}",
+        COLOR=color,
+        TIME=time_text,
+        STATUS=status_text,
+    )
+
+
+# 초 단위 틱에서 진행률은 정수 %로 양자화하면 거의 매번 캐시에 맞는다
+@functools.lru_cache(maxsize=4096)
+def _pie_cached(prog_int: int, color: str, time_txt: str, status: str) -> str:
+    return get_filled_pie_html(prog_int, color, time_txt, status)
 
 
 # ==========================================
@@ -417,26 +721,27 @@ defaults = {
     "phase": "IDLE",
     "phase_start_dt": None,
     "phase_end_dt": None,
+    "phase_start_mono": None,
+    "phase_end_mono": None,
     "pause_started_at": None,
+    "pause_started_mono": None,
     "pause_snapshot_prog": None,
     "pause_snapshot_rem_sec": None,
     "seat_extension_min": 0,
-    "show_extension_dialog": False,
+    "active_dialog": None,
     "extension_seat_left_sec": None,
     "seat_extension_context": "break",
     "seat_alert_shown_in_rest": False,
-    "show_start_setup": False,
     "pending_start": False,
     "pending_resume": False,
     "pending_focus": 25,
     "pending_rest": 5,
-    "show_pause_dialog": False,
-    "show_stop_dialog": False,
     "prev_seat_toggle": False,
-    "show_seat_settings": False,
     "seat_autopopup_done": False,
     "block_next_focus_until_seat_extended": False,
     "need_main_rerun": False,
+    "todos_version": 0,
+    "sessions_version": 0,
 }
 for k, v in defaults.items():
     if k not in st.session_state:
@@ -445,34 +750,29 @@ for k, v in defaults.items():
 if "settings" not in st.session_state:
     st.session_state["settings"] = {
         "use_seat": False,
-        "seat_start_dt": datetime.now().replace(second=0, microsecond=0),
         "focus": 25,
         "rest": 5,
     }
+    set_seat_start_dt(st.session_state["settings"], datetime.now().replace(second=0, microsecond=0))
 
 conn = get_conn()
 init_db(conn)
 
 
-def _clear_dialog_flags() -> None:
-    st.session_state["show_start_setup"] = False
-    st.session_state["show_extension_dialog"] = False
-    st.session_state["show_pause_dialog"] = False
-    st.session_state["show_stop_dialog"] = False
-    st.session_state["show_seat_settings"] = False
+def _close_dialog() -> None:
+    st.session_state["active_dialog"] = None
 
 
 def _open_dialog(name: str) -> None:
-    _clear_dialog_flags()
-    st.session_state[name] = True
+    # 단일 키라 플래그가 동시에 두 개 켜지는 부류의 버그가 원천적으로 없다
+    st.session_state["active_dialog"] = name
     st.rerun()
 
 
 def _request_extension_popup(context: str, seat_left_sec: float) -> None:
     st.session_state["seat_extension_context"] = context
     st.session_state["extension_seat_left_sec"] = float(max(0.0, seat_left_sec))
-    _clear_dialog_flags()
-    st.session_state["show_extension_dialog"] = True
+    st.session_state["active_dialog"] = "ext"
     st.session_state["need_main_rerun"] = True
 
 
@@ -483,12 +783,17 @@ def _start_timer_session(now: datetime, focus_min: int, rest_min: int) -> None:
     st.session_state["running"] = True
     st.session_state["paused"] = False
     st.session_state["pause_started_at"] = None
+    st.session_state["pause_started_mono"] = None
     st.session_state["pause_snapshot_prog"] = None
     st.session_state["pause_snapshot_rem_sec"] = None
 
     st.session_state["phase"] = "FOCUS"
     st.session_state["phase_start_dt"] = now
     st.session_state["phase_end_dt"] = now + timedelta(minutes=int(focus_min))
+    # 틱 연산용 단조 시계 기준점 (벽시계 datetime은 DB 기록용으로만 유지)
+    mono = time.monotonic()
+    st.session_state["phase_start_mono"] = mono
+    st.session_state["phase_end_mono"] = mono + int(focus_min) * 60
 
     st.session_state["seat_alert_shown_in_rest"] = False
     st.session_state["seat_extension_context"] = "break"
@@ -505,14 +810,16 @@ def _switch_phase(now: datetime, to_phase: str) -> None:
 
     st.session_state["phase"] = to_phase
     st.session_state["phase_start_dt"] = now
+    mono = time.monotonic()
+    st.session_state["phase_start_mono"] = mono
 
     if to_phase == "FOCUS":
         st.session_state["phase_end_dt"] = now + timedelta(minutes=focus_min)
-        st.session_state["phase_start_dt"] = now
+        st.session_state["phase_end_mono"] = mono + focus_min * 60
 
     elif to_phase == "REST":
         st.session_state["phase_end_dt"] = now + timedelta(minutes=rest_min)
-        st.session_state["phase_start_dt"] = now
+        st.session_state["phase_end_mono"] = mono + rest_min * 60
 
         st.session_state["seat_alert_shown_in_rest"] = False
 
@@ -527,6 +834,7 @@ def _switch_phase(now: datetime, to_phase: str) -> None:
 
     else:
         st.session_state["phase_end_dt"] = None
+        st.session_state["phase_end_mono"] = None
 
 
 def _resume_timer(now: datetime) -> None:
@@ -540,8 +848,16 @@ def _resume_timer(now: datetime) -> None:
         if pe is not None:
             st.session_state["phase_end_dt"] = pe + paused_delta
 
+    pause_started_mono = st.session_state.get("pause_started_mono")
+    if pause_started_mono is not None:
+        paused_mono = time.monotonic() - pause_started_mono
+        for key in ("phase_start_mono", "phase_end_mono"):
+            if st.session_state.get(key) is not None:
+                st.session_state[key] += paused_mono
+
     st.session_state["paused"] = False
     st.session_state["pause_started_at"] = None
+    st.session_state["pause_started_mono"] = None
     st.session_state["pause_snapshot_prog"] = None
     st.session_state["pause_snapshot_rem_sec"] = None
 
@@ -583,7 +899,7 @@ def seat_settings_dialog():
                 candidate = datetime.combine(now.date(), new_time)
                 if candidate > now + timedelta(minutes=5):
                     candidate -= timedelta(days=1)
-                st.session_state["settings"]["seat_start_dt"] = candidate
+                set_seat_start_dt(st.session_state["settings"], candidate)
             else:
                 expiry_time = new_time
                 if expiry_time > dtime(SEAT_CLOSE_HOUR, 0):
@@ -592,7 +908,7 @@ def seat_settings_dialog():
                 if expiry_candidate < now - timedelta(minutes=5):
                     expiry_candidate += timedelta(days=1)
                 seat_start = expiry_candidate - timedelta(minutes=SEAT_BASE_MIN)
-                st.session_state["settings"]["seat_start_dt"] = seat_start
+                set_seat_start_dt(st.session_state["settings"], seat_start)
 
             st.session_state["seat_extension_min"] = 0
             st.session_state["seat_alert_shown_in_rest"] = False
@@ -601,11 +917,11 @@ def seat_settings_dialog():
 
         st.success("좌석 시간 저장 완료")
         time.sleep(0.5)
-        _clear_dialog_flags()
+        _close_dialog()
         st.rerun()
 
     if st.button("닫기", width="stretch"):
-        _clear_dialog_flags()
+        _close_dialog()
         st.rerun()
 
 
@@ -647,13 +963,13 @@ def start_setup_dialog():
                 st.rerun()
                 return
 
-        _clear_dialog_flags()
+        _close_dialog()
         _start_timer_session(now, f, r)
         time.sleep(0.5)
         st.rerun()
 
     if st.button("닫기", width="stretch"):
-        _clear_dialog_flags()
+        _close_dialog()
         st.rerun()
 
 @st.dialog("🚨 좌석 체크")
@@ -695,7 +1011,7 @@ def extension_dialog():
 
     # 4. 연장 성공 시 -> 차단 풀고 진행
     if changed:
-        _clear_dialog_flags()
+        _close_dialog()
         st.session_state["extension_seat_left_sec"] = None
         
         now = datetime.now().replace(microsecond=0)
@@ -731,7 +1047,7 @@ def extension_dialog():
         close_label = "종료 (그만하기)"
     
     if st.button(close_label, width="stretch"):
-        _clear_dialog_flags()
+        _close_dialog()
         
         # [Strict Mode] 연장 없이 닫으면 -> 작업을 취소하거나 세션을 종료함
         
@@ -761,14 +1077,15 @@ def pause_dialog():
         now = datetime.now().replace(microsecond=0)
         cur_phase = str(st.session_state.get("phase", "UNKNOWN"))
 
-        if cur_phase == "FOCUS" and st.session_state.get("phase_start_dt"):
-            log_focus_segment_if_any(conn, st.session_state.get("phase_start_dt"), now)
-
-        conn.cursor().execute(
-            "INSERT INTO interruptions (timestamp, reason, duration_lost, phase) VALUES (?, ?, ?, ?)",
-            (now.strftime("%Y-%m-%d %H:%M:%S"), f"[중단] {reason}", 0, cur_phase),
-        )
-        conn.commit()
+        # 세션 구간 + 중단 기록을 트랜잭션 하나로 (fsync 1회)
+        with conn:
+            if cur_phase == "FOCUS" and st.session_state.get("phase_start_dt"):
+                log_focus_segment_if_any(conn, st.session_state.get("phase_start_dt"), now)
+            conn.execute(
+                "INSERT INTO interruptions (timestamp, reason, duration_lost, phase) VALUES (?, ?, ?, ?)",
+                (now.strftime("%Y-%m-%d %H:%M:%S"), f"[중단] {reason}", 0, cur_phase),
+            )
+        _bump_version("sessions_version")
 
         phase_start = st.session_state.get("phase_start_dt")
         phase_end = st.session_state.get("phase_end_dt")
@@ -785,14 +1102,15 @@ def pause_dialog():
 
         st.session_state["paused"] = True
         st.session_state["pause_started_at"] = now
+        st.session_state["pause_started_mono"] = time.monotonic()
 
         st.success("⏸️ 일시정지 완료!")
         time.sleep(0.5)
-        _clear_dialog_flags()
+        _close_dialog()
         st.rerun()
 
     if st.button("닫기", width="stretch"):
-        _clear_dialog_flags()
+        _close_dialog()
         st.rerun()
 
 
@@ -805,36 +1123,50 @@ def stop_dialog():
         now = datetime.now().replace(microsecond=0)
         cur_phase = str(st.session_state.get("phase", "UNKNOWN"))
 
-        if cur_phase == "FOCUS" and st.session_state.get("phase_start_dt"):
-            log_focus_segment_if_any(conn, st.session_state.get("phase_start_dt"), now)
-
-        conn.cursor().execute(
-            "INSERT INTO interruptions (timestamp, reason, duration_lost, phase) VALUES (?, ?, ?, ?)",
-            (now.strftime("%Y-%m-%d %H:%M:%S"), f"[종료] {reason}", 0, cur_phase),
-        )
-        conn.commit()
+        # 세션 구간 + 종료 기록을 트랜잭션 하나로 (fsync 1회)
+        with conn:
+            if cur_phase == "FOCUS" and st.session_state.get("phase_start_dt"):
+                log_focus_segment_if_any(conn, st.session_state.get("phase_start_dt"), now)
+            conn.execute(
+                "INSERT INTO interruptions (timestamp, reason, duration_lost, phase) VALUES (?, ?, ?, ?)",
+                (now.strftime("%Y-%m-%d %H:%M:%S"), f"[종료] {reason}", 0, cur_phase),
+            )
+        _bump_version("sessions_version")
 
         st.session_state["running"] = False
         st.session_state["paused"] = False
         st.session_state["pause_started_at"] = None
+        st.session_state["pause_started_mono"] = None
         st.session_state["pause_snapshot_prog"] = None
         st.session_state["pause_snapshot_rem_sec"] = None
         st.session_state["phase"] = "IDLE"
         st.session_state["phase_start_dt"] = None
         st.session_state["phase_end_dt"] = None
+        st.session_state["phase_start_mono"] = None
+        st.session_state["phase_end_mono"] = None
         st.session_state["seat_alert_shown_in_rest"] = False
         st.session_state["block_next_focus_until_seat_extended"] = False
 
         st.success("학습 종료!")
         time.sleep(0.5)
-        _clear_dialog_flags()
+        _close_dialog()
         st.rerun()
 
     if st.button("닫기", width="stretch"):
-        _clear_dialog_flags()
+        _close_dialog()
         st.rerun()
 
 
+# active_dialog 키 → 다이얼로그 함수 디스패치 테이블
+_DIALOGS = {
+    "seat": seat_settings_dialog,
+    "start": start_setup_dialog,
+    "ext": extension_dialog,
+    "pause": pause_dialog,
+    "stop": stop_dialog,
+}
+
+
 # ==========================================
 # Sidebar
 # ==========================================
@@ -848,14 +1180,16 @@ with st.sidebar:
             st.error("API 키를 먼저 입력해주세요.")
         else:
             try:
-                _ = genai.Client(api_key=api_key)
+                _ = _get_genai_client(api_key)
                 st.success("✅ 연결 성공!")
             except Exception as e:
                 st.error(f"❌ 연결 실패:\n{str(e)}")
 
     st.divider()
     if st.button("🗑️ 데이터 초기화", width="stretch"):
-        reset_db()
+        reset_db(conn)
+        _bump_version("todos_version")
+        _bump_version("sessions_version")
         st.success("데이터 삭제 완료!")
         time.sleep(0.5)
         st.rerun()
@@ -906,19 +1240,19 @@ with tab1:
                 now_date = datetime.now().date()
                 
                 if saved_dt and saved_dt.date() < now_date:
-                     st.session_state["settings"]["seat_start_dt"] = datetime.now().replace(second=0, microsecond=0)
+                     set_seat_start_dt(st.session_state["settings"], datetime.now().replace(second=0, microsecond=0))
                 
                 if (not lock_settings) and (not st.session_state.get("seat_autopopup_done", False)):
                     st.session_state["seat_autopopup_done"] = True
                     want_open_seat_dialog = True
 
             if want_open_seat_dialog:
-                _open_dialog("show_seat_settings")
+                _open_dialog("seat")
 
         with topB:
             if not st.session_state["running"]:
                 if st.button("▶️ 공부 시작", type="primary", width="stretch"):
-                    _open_dialog("show_start_setup")
+                    _open_dialog("start")
             else:
                 if st.session_state["paused"]:
                     if st.button("▶️ 재개", type="primary", width="stretch"):
@@ -939,7 +1273,7 @@ with tab1:
                                 st.session_state["pending_resume"] = True
                                 st.session_state["seat_extension_context"] = "resume"
                                 st.session_state["extension_seat_left_sec"] = float(left_sec) 
-                                _open_dialog("show_extension_dialog")
+                                _open_dialog("ext")
                         
                         # 문제가 없을 때만(False일 때만) 타이머 재개
                         if not is_seat_issue:
@@ -949,85 +1283,58 @@ with tab1:
                 else:
                     st.button("⏱️ 실행 중", width="stretch", disabled=True)
 
-        @st.fragment(run_every=1)
+        # 유휴 상태에서는 폴링 자체를 끈다 — run_every는 스크립트 실행 시점에
+        # 계산되고, 상태 전이는 전부 전체 rerun을 거치므로 cadence가 따라 바뀐다
+        _timer_active = st.session_state["running"] and not st.session_state.get("paused")
+        _timer_tick = 1 if _timer_active else None
+        _check_tick = 5 if _timer_active else None
+        _seat_tick = 1 if st.session_state["settings"].get("use_seat", False) else None
+
+        @st.fragment(run_every=_seat_tick)
         def seat_always_box():
             if not st.session_state["settings"].get("use_seat", False):
                 return
-            now = datetime.now().replace(microsecond=0)
-            if is_seat_reset_window(now):
-                nxt = next_seat_open_dt(now)
-                msg = f"🪑 23:00~06:00 (예약 불필요) · 다음 운영 {nxt.strftime('%H:%M')}"
-                st.markdown(
-                    f"<div class='seat-box' style='margin-top:0;'><div class='seat-ok'><b>{msg}</b></div></div>",
-                    unsafe_allow_html=True,
-                )
-                return
-
+            # 1초 틱이므로 microsecond 절삭용 datetime 재할당 없이 그대로 쓴다
+            now = datetime.now()
             seat_start_dt = st.session_state["settings"].get("seat_start_dt")
-            if not seat_start_dt:
-                st.markdown(
-                    "<div class='seat-box' style='margin-top:0;'><div class='seat-exp'>🪑 좌석 시간 미설정</div></div>",
-                    unsafe_allow_html=True,
-                )
-                return
-
-            left_sec = compute_seat_left_seconds(now, seat_start_dt, st.session_state.get("seat_extension_min", 0))
-            expiry = get_seat_expiry_dt(seat_start_dt, st.session_state.get("seat_extension_min", 0))
-
-            if now < seat_start_dt:
-                st.markdown(
-                    f"<div class='seat-box' style='margin-top:0;'><div class='seat-ok'>🪑 예약 전 · 시작 {seat_start_dt.strftime('%H:%M')}</div></div>",
-                    unsafe_allow_html=True,
-                )
-            elif left_sec is not None and left_sec > 0:
-                txt = format_hms(left_sec)
-                st.markdown(
-                    f"<div class='seat-box' style='margin-top:0;'><div class='seat-ok'>🪑 만료까지 <b>{txt}</b> · ({expiry.strftime('%H:%M')})</div></div>",
-                    unsafe_allow_html=True,
-                )
+            if is_seat_reset_window(now):
+                html = _SEAT_RESET_TMPL % next_seat_open_dt(now).strftime("%H:%M")
+            elif not seat_start_dt:
+                html = _SEAT_UNSET_HTML
             else:
-                st.markdown(
-                    "<div class='seat-box' style='margin-top:0;'><div class='seat-exp'>🪑 좌석 만료</div></div>",
-                    unsafe_allow_html=True,
-                )
+                # 틱마다 datetime 연산 대신 저장해 둔 epoch 정수 연산
+                ext_min = st.session_state.get("seat_extension_min", 0)
+                start_epoch = st.session_state["settings"].get("seat_start_epoch")
+                close_epoch = st.session_state["settings"].get("seat_close_epoch")
+                now_epoch = now.timestamp()
+                left_sec = compute_seat_left_seconds_epoch(now_epoch, start_epoch, close_epoch, ext_min)
+
+                if start_epoch is not None and now_epoch < start_epoch:
+                    html = _SEAT_PRE_TMPL % seat_start_dt.strftime("%H:%M")
+                elif left_sec is not None and left_sec > 0:
+                    expiry = datetime.fromtimestamp(get_seat_expiry_epoch(start_epoch, close_epoch, ext_min))
+                    html = _SEAT_OK_TMPL % (format_hms(int(left_sec)), expiry.strftime("%H:%M"))
+                else:
+                    html = _SEAT_EXP_HTML
+
+            st.markdown(html, unsafe_allow_html=True)
 
         seat_always_box()
         st.write("")
 
-        @st.fragment(run_every=1)
-        def run_timer_fragment():
+        @st.fragment(run_every=_timer_tick)
+        def draw_pie_fragment():
+            """1초 틱은 그리기 전용 — 상태 전이/좌석 체크는 phase_check_fragment가 맡는다."""
             if not st.session_state["running"]:
-                st.markdown(get_filled_pie_html(0, "#ccc", "00:00", "대기 중"), unsafe_allow_html=True)
+                st.markdown(_pie_cached(0, "#ccc", "00:00", "대기 중"), unsafe_allow_html=True)
                 return
 
-            now = datetime.now().replace(microsecond=0)
-
             # ---------------------------------------------------------
-            # 1. 차단 상태 확인 (휴식 종료 후 좌석 연장 대기 중)
+            # 1. 차단 상태 (휴식 종료 후 좌석 연장 대기 중)
             # ---------------------------------------------------------
             if st.session_state.get("block_next_focus_until_seat_extended", False):
-                # 강제로 상태를 REST로 고정하고, 시간을 멈춤
-                st.session_state["phase"] = "REST"
-                st.session_state["phase_end_dt"] = now  # 끝난 상태 유지
-                
-                # 팝업이 닫혀있다면 다시 켬 (연장할 때까지 팝업)
-                if not st.session_state.get("show_extension_dialog", False):
-                    # 다시 팝업 요청
-                    st.session_state["seat_extension_context"] = "break"
-                    if st.session_state["settings"].get("use_seat", False):
-                        seat_start_dt = st.session_state["settings"].get("seat_start_dt")
-                        seat_left_sec = compute_seat_left_seconds(
-                            now, seat_start_dt, st.session_state.get("seat_extension_min", 0)
-                        )
-                        if seat_left_sec is not None:
-                            st.session_state["extension_seat_left_sec"] = float(max(0.0, seat_left_sec))
-                    
-                    st.session_state["show_extension_dialog"] = True
-                    st.session_state["need_main_rerun"] = True
-                    return
-
                 # 화면 표시: 꽉 찬 초록색 원 + 00:00 + 대기 문구
-                st.markdown(get_filled_pie_html(100, "#4CAF50", "00:00", "휴식(대기) ⛔"), unsafe_allow_html=True)
+                st.markdown(_pie_cached(100, "#4CAF50", "00:00", "휴식(대기) ⛔"), unsafe_allow_html=True)
                 return
 
             # ---------------------------------------------------------
@@ -1040,51 +1347,87 @@ with tab1:
                 snap_prog = st.session_state.get("pause_snapshot_prog")
                 snap_rem = st.session_state.get("pause_snapshot_rem_sec")
                 if snap_prog is None or snap_rem is None:
-                    st.markdown(get_filled_pie_html(0, "#999", "PAUSE", "일시정지 ⏸️"), unsafe_allow_html=True)
+                    st.markdown(_pie_cached(0, "#999", "PAUSE", "일시정지 ⏸️"), unsafe_allow_html=True)
                     return
                 rem_sec = max(0.0, float(snap_rem))
                 time_txt = f"{int(rem_sec//60):02d}:{int(rem_sec%60):02d}"
-                st.markdown(get_filled_pie_html(float(snap_prog), color, time_txt, status), unsafe_allow_html=True)
+                st.markdown(_pie_cached(int(snap_prog), color, time_txt, status), unsafe_allow_html=True)
                 return
 
             # ---------------------------------------------------------
             # 3. 타이머 실행 화면
             # ---------------------------------------------------------
             phase = st.session_state.get("phase", "IDLE")
-            phase_start = st.session_state.get("phase_start_dt")
-            phase_end = st.session_state.get("phase_end_dt")
-            
-            if phase not in ("FOCUS", "REST") or (phase_start is None) or (phase_end is None):
-                st.markdown(get_filled_pie_html(0, "#ccc", "00:00", "대기 중"), unsafe_allow_html=True)
+            start_mono = st.session_state.get("phase_start_mono")
+            end_mono = st.session_state.get("phase_end_mono")
+
+            if phase not in ("FOCUS", "REST") or (start_mono is None) or (end_mono is None):
+                st.markdown(_pie_cached(0, "#ccc", "00:00", "대기 중"), unsafe_allow_html=True)
                 return
 
-            total_sec = max(1.0, (phase_end - phase_start).total_seconds())
-            rem_sec = max(0.0, (phase_end - now).total_seconds())
-            elapsed = max(0.0, (now - phase_start).total_seconds())
+            # 단조 시계 float 연산 — 틱마다 datetime/timedelta를 만들지 않고 시계 역행에도 안전
+            now_mono = time.monotonic()
+            total_sec = max(1.0, end_mono - start_mono)
+            rem_sec = max(0.0, end_mono - now_mono)
+            elapsed = max(0.0, now_mono - start_mono)
             prog = min(100.0, (elapsed / total_sec) * 100.0)
 
             is_focus = (phase == "FOCUS")
             color, status = ("#FF4B4B", "집중 🔥") if is_focus else ("#4CAF50", "휴식 ☕")
-            
+
             st.markdown(
-                get_filled_pie_html(prog, color, f"{int(rem_sec//60):02d}:{int(rem_sec%60):02d}", status),
+                _pie_cached(int(prog), color, f"{int(rem_sec//60):02d}:{int(rem_sec%60):02d}", status),
                 unsafe_allow_html=True,
             )
 
+        def _phase_check_events():
+            if not st.session_state["running"] or st.session_state.get("paused"):
+                return
+
+            now = datetime.now().replace(microsecond=0)
+
+            # ---------------------------------------------------------
+            # 1. 차단 상태: 연장할 때까지 팝업 유지
+            # ---------------------------------------------------------
+            if st.session_state.get("block_next_focus_until_seat_extended", False):
+                if st.session_state.get("active_dialog") != "ext":
+                    st.session_state["seat_extension_context"] = "break"
+                    if st.session_state["settings"].get("use_seat", False):
+                        seat_start_dt = st.session_state["settings"].get("seat_start_dt")
+                        seat_left_sec = compute_seat_left_seconds(
+                            now, seat_start_dt, st.session_state.get("seat_extension_min", 0)
+                        )
+                        if seat_left_sec is not None:
+                            st.session_state["extension_seat_left_sec"] = float(max(0.0, seat_left_sec))
+
+                    st.session_state["active_dialog"] = "ext"
+                    st.session_state["need_main_rerun"] = True
+                return
+
+            phase = st.session_state.get("phase", "IDLE")
+            end_mono = st.session_state.get("phase_end_mono")
+            if phase not in ("FOCUS", "REST") or end_mono is None:
+                return
+
+            now_mono = time.monotonic()
+            is_focus = (phase == "FOCUS")
+
             # ---------------------------------------------------------
             # 4. 구간 종료 처리 (0초 도달 시)
             # ---------------------------------------------------------
-            if now >= phase_end:
+            if now_mono >= end_mono:
                 # [CASE A] FOCUS 종료 → REST 시작
                 if phase == "FOCUS":
                     if st.session_state.get("phase_start_dt"):
-                        log_focus_segment_if_any(conn, st.session_state.get("phase_start_dt"), now)
+                        with conn:
+                            log_focus_segment_if_any(conn, st.session_state.get("phase_start_dt"), now)
+                        _bump_version("sessions_version")
 
                     _switch_phase(now, "REST")
                     st.session_state["block_next_focus_until_seat_extended"] = False
                     
                     # 휴식 시작 팝업이 떴다면 즉시 띄우기 위해 리런
-                    if st.session_state.get("show_extension_dialog", False):
+                    if st.session_state.get("active_dialog") == "ext":
                         st.session_state["need_main_rerun"] = True
                     return
 
@@ -1093,9 +1436,11 @@ with tab1:
                     use_seat = st.session_state["settings"].get("use_seat", False)
 
                     if use_seat and (not is_seat_reset_window(now)):
-                        seat_start_dt = st.session_state["settings"].get("seat_start_dt")
-                        seat_left_sec = compute_seat_left_seconds(
-                            now, seat_start_dt, st.session_state.get("seat_extension_min", 0)
+                        seat_left_sec = compute_seat_left_seconds_epoch(
+                            now.timestamp(),
+                            st.session_state["settings"].get("seat_start_epoch"),
+                            st.session_state["settings"].get("seat_close_epoch"),
+                            st.session_state.get("seat_extension_min", 0),
                         )
 
                         # 좌석 <= 59분이면: 다음 FOCUS 진입 차단 + 멈춤
@@ -1104,11 +1449,12 @@ with tab1:
                             st.session_state["seat_extension_context"] = "break"
                             st.session_state["extension_seat_left_sec"] = float(seat_left_sec)
 
-                            st.session_state["show_extension_dialog"] = True
-                            
+                            st.session_state["active_dialog"] = "ext"
+
                             # 현재 시각으로 종료 시각을 고정해 타이머 멈춤 (00:00)
-                            st.session_state["phase_end_dt"] = now 
-                            
+                            st.session_state["phase_end_dt"] = now
+                            st.session_state["phase_end_mono"] = now_mono
+
                             st.session_state["need_main_rerun"] = True
                             return
 
@@ -1121,34 +1467,42 @@ with tab1:
             # 5. (휴식 중) 좌석 59분 이하 알림 (1회성)
             # ---------------------------------------------------------
             if (not is_focus) and st.session_state["settings"].get("use_seat", False):
+                if st.session_state.get("seat_alert_shown_in_rest", False):
+                    return  # 이번 휴식에서 이미 알렸으면 좌석 계산도 생략
                 if not is_seat_reset_window(now):
-                    seat_start_dt = st.session_state["settings"].get("seat_start_dt")
-                    seat_left_sec = compute_seat_left_seconds(
-                        now, seat_start_dt, st.session_state.get("seat_extension_min", 0)
+                    seat_left_sec = compute_seat_left_seconds_epoch(
+                        now.timestamp(),
+                        st.session_state["settings"].get("seat_start_epoch"),
+                        st.session_state["settings"].get("seat_close_epoch"),
+                        st.session_state.get("seat_extension_min", 0),
                     )
 
                     if seat_left_sec is not None and (seat_left_sec <= SEAT_ALERT_WINDOW_SEC):
-                        if not st.session_state.get("seat_alert_shown_in_rest", False):
-                            st.session_state["seat_alert_shown_in_rest"] = True
-                            st.session_state["seat_extension_context"] = "break"
-                            st.session_state["extension_seat_left_sec"] = float(seat_left_sec)
+                        st.session_state["seat_alert_shown_in_rest"] = True
+                        st.session_state["seat_extension_context"] = "break"
+                        st.session_state["extension_seat_left_sec"] = float(seat_left_sec)
 
-                            st.session_state["show_extension_dialog"] = True
-                            st.session_state["need_main_rerun"] = True
-                            return
-        run_timer_fragment()
+                        st.session_state["active_dialog"] = "ext"
+                        st.session_state["need_main_rerun"] = True
+                        return
+
+        @st.fragment(run_every=_check_tick)
+        def phase_check_fragment():
+            """구간 종료/좌석 임박 이벤트는 5초 간격 점검이면 충분하다."""
+            _phase_check_events()
+            # 모달(다이얼로그) 전이일 때만 전체 rerun으로 승격 —
+            # 단순 구간 전환은 다음 그리기 틱이 집어가므로 rerun이 필요 없다
+            if st.session_state.get("need_main_rerun", False):
+                st.session_state["need_main_rerun"] = False
+                st.rerun(scope="app")
+
+        draw_pie_fragment()
+        phase_check_fragment()
 
         # 다이얼로그는 여기서 "딱 하나"만 오픈 (fragment 밖)
-        if st.session_state.get("show_seat_settings", False):
-            seat_settings_dialog()
-        elif st.session_state.get("show_start_setup", False):
-            start_setup_dialog()
-        elif st.session_state.get("show_extension_dialog", False):
-            extension_dialog()
-        elif st.session_state.get("show_stop_dialog", False):
-            stop_dialog()
-        elif st.session_state.get("show_pause_dialog", False):
-            pause_dialog()
+        active_dialog = st.session_state.get("active_dialog")
+        if active_dialog is not None:
+            _DIALOGS[active_dialog]()
 
         # fragment에서 다이얼로그 띄우라고 플래그만 켠 경우, 메인 rerun으로 반영
         if st.session_state.get("need_main_rerun", False):
@@ -1160,10 +1514,10 @@ with tab1:
         if st.session_state.get("running", False):
             with cA:
                 if st.button("⏸️ 중단", width="stretch", disabled=st.session_state.get("paused", False)):
-                    _open_dialog("show_pause_dialog")
+                    _open_dialog("pause")
             with cB:
                 if st.button("🏁 종료", width="stretch"):
-                    _open_dialog("show_stop_dialog")
+                    _open_dialog("stop")
 
     with col_todo:
         st.markdown(
@@ -1176,90 +1530,67 @@ with tab1:
             new_task = f_col1.text_input("할 일", label_visibility="collapsed", placeholder="할 일 추가")
             submit = f_col2.form_submit_button("추가", width="stretch")
 
-        # TODO 추가: 새 항목이 "맨 아래"에 보이도록
+        # TODO 추가: 새 항목이 "맨 아래"에 보이도록 — MAX 조회를 INSERT에 합쳐 왕복 1회
         if submit and new_task:
-            max_order = pd.read_sql(
-                "SELECT MAX(task_order) AS m FROM todos WHERE status != 'deleted'",
-                conn
-            ).iloc[0, 0]
-            if pd.isna(max_order):
-                max_order = 0
-
-            conn.cursor().execute(
-                "INSERT INTO todos (task, status, date, is_subtask, task_order) VALUES (?, ?, ?, ?, ?)",
-                (new_task, "pending", datetime.now().strftime("%Y-%m-%d"), 0, int(max_order) + 1),
+            conn.execute(
+                """
+                INSERT INTO todos (task, status, date, is_subtask, task_order)
+                SELECT ?, ?, ?, ?, COALESCE(MAX(task_order), 0) + 1
+                FROM todos WHERE status != 'deleted'
+                """,
+                (new_task, "pending", datetime.now().strftime("%Y-%m-%d"), 0),
             )
             conn.commit()
+            _bump_version("todos_version")
             st.rerun()
 
-        df_todos = pd.read_sql("SELECT * FROM todos WHERE status != 'deleted' ORDER BY task_order ASC", conn)
+        df_todos = load_todos(st.session_state["todos_version"])
         if not df_todos.empty:
-            for _, row in df_todos.iterrows():
-                c_chk, c_txt, c_del = st.columns([0.6, 8, 1.2])
-                is_done = row["status"] == "done"
-
-                with c_chk:
-                    if st.checkbox(
-                        f"완료_{row['id']}",
-                        value=is_done,
-                        key=f"chk_{row['id']}",
-                        label_visibility="collapsed",
-                    ) != is_done:
-                        new_status = "pending" if is_done else "done"
-                        conn.cursor().execute("UPDATE todos SET status=? WHERE id=?", (new_status, int(row["id"])))
-                        conn.commit()
-                        st.rerun()
-
-                with c_txt:
-                    if is_done:
-                        st.markdown(
-                            f"<div class='todo-text'><span class='todo-done'>{row['task']}</span></div>",
-                            unsafe_allow_html=True,
-                        )
-                    else:
-                        new_val = st.text_input(
-                            "수정", value=str(row["task"]), key=f"edit_{row['id']}", label_visibility="collapsed"
-                        )
-                        if new_val != row["task"]:
-                            conn.cursor().execute("UPDATE todos SET task=? WHERE id=?", (new_val, int(row["id"])))
-                            conn.commit()
-                            st.rerun()
-
-                with c_del:
-                    if st.button("삭제", key=f"del_{row['id']}", width="stretch"):
-                        conn.cursor().execute("UPDATE todos SET status='deleted' WHERE id=?", (int(row["id"]),))
-                        conn.commit()
-                        st.rerun()
+            # 행당 위젯 3개 대신 가상화된 에디터 1개 — 변경분은 on_change diff로만 도착.
+            # 버전이 키에 들어가므로 flush 후에는 깨끗한 에디터 상태로 다시 시작한다
+            editor_key = f"todos_editor_{st.session_state['todos_version']}"
+            st.data_editor(
+                df_todos,
+                column_order=("done", "task"),
+                column_config={
+                    "id": None,
+                    "done": st.column_config.CheckboxColumn("완료", width="small"),
+                    "task": st.column_config.TextColumn("할 일"),
+                },
+                num_rows="dynamic",
+                hide_index=True,
+                width="stretch",
+                key=editor_key,
+                on_change=_flush_todos,
+                args=(editor_key,),
+            )
         else:
             st.info("할 일이 없습니다.")
 
 
-with tab2:
+# 리포트 탭은 독립 fragment — 타이머 쪽 상호작용으로 전체 rerun이 나도
+# 차트 블록은 자기 위젯이 바뀔 때만 다시 계산된다
+@st.fragment
+def analytics_tab() -> None:
+    import plotly.graph_objects as go
+
     st.header("📊 학습 분석 리포트")
 
-    df_s = pd.read_sql("SELECT * FROM study_sessions", conn)
-    df_i = pd.read_sql("SELECT * FROM interruptions", conn)
+    df_s = prep_sessions(st.session_state["sessions_version"])
+    df_i = load_interruptions(st.session_state["sessions_version"])
 
     if not df_s.empty:
-        df_s["start_time"] = pd.to_datetime(df_s["start_time"], errors="coerce")
-        df_s["focus_minutes"] = pd.to_numeric(df_s["focus_minutes"], errors="coerce").fillna(0)
-
-        period = st.radio("조회 기간 선택", ["최근 1주일", "최근 1개월"], horizontal=True)
+        # form으로 묶어 라디오 클릭마다가 아니라 '조회'를 눌렀을 때만 차트를 다시 만든다
+        with st.form("report_form"):
+            period = st.radio("조회 기간 선택", ["최근 1주일", "최근 1개월"], horizontal=True)
+            st.form_submit_button("조회")
         days = 7 if period == "최근 1주일" else 30
-        cutoff = datetime.now() - timedelta(days=days)
-        df_filtered = df_s[df_s["start_time"] >= cutoff].copy()
+        version = st.session_state["sessions_version"]
 
         st.subheader(f"📈 {period} 집중 시간 추이")
-        df_daily = df_filtered.groupby(df_filtered["start_time"].dt.date)["focus_minutes"].sum().reset_index()
-        df_daily.columns = ["날짜", "집중시간(분)"]
-        df_daily = df_daily.sort_values("날짜")
-
-        if not df_daily.empty:
-            df_daily["날짜_dt"] = pd.to_datetime(df_daily["날짜"])
-            fig = px.line(df_daily, x="날짜_dt", y="집중시간(분)", markers=True, text="집중시간(분)")
-            fig.update_layout(hovermode="x unified", xaxis_title=None)
-            fig.update_traces(line_width=3, marker_size=10, textposition="top center")
-            st.plotly_chart(fig, width="stretch")
+        daily_fig = build_daily_fig(version, days)
+        if daily_fig is not None:
+            st.plotly_chart(go.Figure(daily_fig), width="stretch")
 
         st.write("")
         st.subheader("🔍 심층 분석")
@@ -1267,66 +1598,24 @@ with tab2:
 
         with row1_c1:
             st.markdown("**📅 집중 리듬 (요일 x 시간대)**")
-            if not df_filtered.empty:
-                df_hm = df_filtered.copy()
-                df_hm["weekday"] = df_hm["start_time"].dt.day_name()
-                df_hm["hour"] = df_hm["start_time"].dt.hour
-
-                days_order = list(calendar.day_name)
-                df_hm["weekday"] = pd.Categorical(df_hm["weekday"], categories=days_order, ordered=True)
-
-                heatmap_data = df_hm.groupby(["weekday", "hour"], observed=False)["focus_minutes"].sum().reset_index()
-                pivot_table = heatmap_data.pivot(index="hour", columns="weekday", values="focus_minutes").fillna(0)
-
-                all_hours = list(range(24))
-                pivot_table = pivot_table.reindex(index=all_hours, columns=days_order, fill_value=0)
-
-                fig_hm = px.imshow(
-                    pivot_table,
-                    labels=dict(x="요일", y="시간", color="분"),
-                    x=days_order,
-                    y=all_hours,
-                    color_continuous_scale="Reds",
-                    aspect="auto",
-                )
-
-                tickvals = [0, 6, 12, 18, 23]
-                ticktext = ["00:00", "06:00", "12:00", "18:00", "24:00"]
-
-                fig_hm.update_yaxes(
-                    tickmode="array",
-                    tickvals=tickvals,
-                    ticktext=ticktext,
-                    autorange="reversed",
-                )
-                fig_hm.update_layout(margin=dict(l=0, r=0, t=0, b=0), height=300)
-                st.plotly_chart(fig_hm, width="stretch")
+            hm_fig = build_heatmap_fig(version, days)
+            if hm_fig is not None:
+                st.plotly_chart(go.Figure(hm_fig), width="stretch")
             else:
                 st.info("데이터가 부족합니다.")
 
         with row1_c2:
             st.markdown("**🛑 방해 요인 비율 (집중 시간 기준)**")
             if not df_i.empty:
-                df_i_focus = df_i.copy()
-                if "phase" in df_i_focus.columns:
-                    df_i_focus = df_i_focus[df_i_focus["phase"] == "FOCUS"].copy()
-                else:
-                    df_i_focus = df_i_focus.iloc[0:0].copy()
-
                 rest_cnt = 0
                 if "phase" in df_i.columns:
                     rest_cnt = int((df_i["phase"] == "REST").sum())
                 if rest_cnt > 0:
                     st.caption(f"※ 참고: 휴식(REST) 중 기록 {rest_cnt}건은 방해요인 집계에서 제외됨")
 
-                if not df_i_focus.empty:
-                    reason_counts = df_i_focus["reason"].value_counts().reset_index()
-                    reason_counts.columns = ["reason", "count"]
-
-                    fig_pie = px.pie(reason_counts, values="count", names="reason", hole=0.4)
-                    fig_pie.update_layout(margin=dict(l=0, r=0, t=0, b=0), height=300, showlegend=False)
-                    fig_pie.update_traces(textposition="inside", textinfo="percent+label")
-                    st.plotly_chart(fig_pie, width="stretch")
+                pie_fig = build_reason_pie_fig(version)
+                if pie_fig is not None:
+                    st.plotly_chart(go.Figure(pie_fig), width="stretch")
                 else:
                     st.info("집중(FOCUS) 중 중단/종료 기록이 없습니다.")
             else:
@@ -1344,7 +1633,11 @@ with tab2:
             with st.spinner("AI가 데이터를 분석하고 있습니다..."):
                 period = "최근 1주일"
                 days = 7
-                report = ai_generate_report(api_key, df_s, df_i, period, days)
+                report = ai_generate_report(api_key, period, days)
                 st.success("분석 완료!")
                 st.markdown(report)
 
+
+with tab2:
+    analytics_tab()
+